@@ -1,22 +1,39 @@
-from crewai import Agent, Crew, Process, Task
+from crewai import Agent, Crew, LLM, Process, Task
 from crewai.project import CrewBase, agent, crew, task
 from crewai.agents.agent_builder.base_agent import BaseAgent
-from typing import Any, Dict, List, cast
+from crewai.llms.base_llm import BaseLLM
+from crewai.utilities.llm_utils import create_llm
+from litellm import get_llm_provider
+from typing import Any, Dict, FrozenSet, List, Optional, cast
 from anki_flow.crews.tools.custom_tool import ReadMarkdownFolderTool, AnkiConnectAddNotesTool
-from crewai_tools import (
-    FileReadTool,
-    DirectoryReadTool,
-    TXTSearchTool,
-    PDFSearchTool,
-    DOCXSearchTool,
-    CSVSearchTool,
-    JSONSearchTool,
-    XMLSearchTool,
-)
+from anki_flow.utils import verbose
 # If you want to run a snippet of code before or after the crew starts,
 # you can use the @before_kickoff and @after_kickoff decorators
 # https://docs.crewai.com/concepts/crews#example-crew-class-with-decorators
 
+# LiteLLM providers that only cache prompts when cache_control is set explicitly.
+# OpenAI and DeepSeek cache long prompt prefixes automatically.
+_EXPLICIT_CACHE_PROVIDERS = {"anthropic", "gemini", "vertex_ai", "vertex_ai_beta"}
+
+
+def _needs_explicit_cache_control(model: str) -> bool:
+    try:
+        _, provider, _, _ = get_llm_provider(model)
+    except Exception:
+        return False
+    if provider == "bedrock":
+        return "anthropic." in model  # Claude models served through Bedrock
+    return provider in _EXPLICIT_CACHE_PROVIDERS
+
+
+def _generator_llm() -> Optional[BaseLLM]:
+    """Build CrewAI's default LLM, marking the static system prompt as cacheable if the provider needs it."""
+    llm = create_llm()  # same environment-based setup (model, API base, keys) as the other agents
+    if isinstance(llm, LLM) and _needs_explicit_cache_control(llm.model):
+        llm.additional_params["cache_control_injection_points"] = [{"location": "message", "role": "system"}]
+    return llm
+
+
 @CrewBase
 class AnkiCrew():
     """AnkiCrew crew"""
@@ -25,24 +42,57 @@ class AnkiCrew():
     tasks: List[Task]
     agents_config = "config/agents.yaml"
     tasks_config = "config/tasks.yaml"
+    note_extensions: Optional[FrozenSet[str]] = None
+
+    def __init__(self, note_extensions: Optional[FrozenSet[str]] = None) -> None:
+        # File extensions found in the notes folder (lowercase, with dot); None builds every search tool.
+        # Set before CrewBase builds the agents referenced by tasks.yaml.
+        self.note_extensions = note_extensions
+
+    def _search_tools(self) -> List[Any]:
+        # Only instantiate the (embedding-backed) search tools the notes folder actually needs;
+        # .md notes are already covered by ReadMarkdownFolderTool
+        from crewai_tools import (
+            CSVSearchTool,
+            DOCXSearchTool,
+            JSONSearchTool,
+            PDFSearchTool,
+            TXTSearchTool,
+            XMLSearchTool,
+        )
+
+        tools_by_suffix = [
+            ((".txt",), TXTSearchTool),
+            ((".pdf",), PDFSearchTool),
+            ((".docx",), DOCXSearchTool),
+            ((".csv",), CSVSearchTool),
+            ((".json",), JSONSearchTool),
+            ((".xml",), XMLSearchTool),
+        ]
+        extensions = self.note_extensions
+        return [
+            tool_cls()
+            for suffixes, tool_cls in tools_by_suffix
+            if extensions is None or not extensions.isdisjoint(suffixes)
+        ]
 
     @agent
     def flashcard_generator(self) -> Agent:
+        # Importing any crewai_tools class loads the whole package (chromadb/embedchain included);
+        # deferred to agent construction rather than module import, so it is postponed, not avoided
+        from crewai_tools import DirectoryReadTool, FileReadTool
+
         agents_cfg = cast(Dict[str, Any], self.agents_config)
         return Agent(
             config=agents_cfg['flashcard_generator'], # type: ignore[index]
+            llm=_generator_llm(),
             tools=[
                 ReadMarkdownFolderTool(),
                 DirectoryReadTool(),
                 FileReadTool(),
-                TXTSearchTool(),
-                PDFSearchTool(),
-                DOCXSearchTool(),
-                CSVSearchTool(),
-                JSONSearchTool(),
-                XMLSearchTool(),
+                *self._search_tools(),
             ],
-            verbose=True,
+            verbose=verbose(),
         )
 
     @agent
@@ -51,7 +101,7 @@ class AnkiCrew():
         return Agent(
             config=agents_cfg['anki_uploader'], # type: ignore[index]
             tools=[AnkiConnectAddNotesTool()],
-            verbose=True,
+            verbose=verbose(),
         )
 
     @task
@@ -76,6 +126,6 @@ class AnkiCrew():
             agents=self.agents, # Automatically created by the @agent decorator
             tasks=self.tasks, # Automatically created by the @task decorator
             process=Process.sequential,
-            verbose=True,
+            verbose=verbose(),
             # process=Process.hierarchical, # In case you wanna use that instead https://docs.crewai.com/how-to/Hierarchical/
         )
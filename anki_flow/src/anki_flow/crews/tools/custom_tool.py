@@ -1,10 +1,45 @@
 from crewai.tools import BaseTool
-from typing import List, Optional, Tuple, Type
-from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional, Set, Tuple, Type
+from pydantic import BaseModel, Field, PrivateAttr
 import os
 import json
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+
+from anki_flow.utils import dumps, dumps_bytes, iter_files, loads
+
+
+# File name suffixes treated as Markdown; a tuple so str.endswith checks them all in one call
+_MD_SUFFIXES = (".md",)
+
+# Number of notes sent per addNotes call
+_ADD_NOTES_CHUNK_SIZE = 200
+
+# Fields every note and the target model must have
+_REQUIRED_FIELDS = frozenset({"Front", "Back"})
+
+# Shared by every prepared note; never mutated
+_NOTE_OPTIONS = {"allowDuplicate": False}
+
+# (anki_connect_url, model_name) pairs whose Front/Back fields were already verified
+_CHECKED_MODELS: Set[Tuple[str, str]] = set()
+
+# path -> (mtime_ns, size, content) of Markdown files already read in this process
+_MD_CACHE: Dict[str, Tuple[int, int, str]] = {}
+
+
+def _read_one(path: str) -> dict:
+    # Files unchanged since the last read (same mtime and size) are served from memory
+    st = os.stat(path)
+    cached = _MD_CACHE.get(path)
+    if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        text = cached[2]
+    else:
+        with open(path, "rb") as f:
+            text = f.read().decode("utf-8", "ignore")
+        _MD_CACHE[path] = (st.st_mtime_ns, st.st_size, text)
+    return {"path": path, "content": text}
 
 
 class ReadMarkdownFolderInput(BaseModel):
@@ -26,23 +61,13 @@ class ReadMarkdownFolderTool(BaseTool):
                 return json.dumps({"error": "folder_path must be an absolute path"})
             if not os.path.isdir(folder_path):
                 return json.dumps({"error": f"folder_path does not exist or is not a directory: {folder_path}"})
-            md_files: List[Path] = []
-            base = Path(folder_path)
-            if recursive:
-                md_files = list(base.rglob("*.md"))
-            else:
-                md_files = list(base.glob("*.md"))
-
-            results: List[dict] = []
-            for file_path in md_files:
-                try:
-                    text = file_path.read_text(encoding="utf-8")
-                except UnicodeDecodeError:
-                    # Fallback encoding if necessary
-                    text = file_path.read_text(encoding="utf-8", errors="ignore")
-                results.append({"path": str(file_path), "content": text})
-
-            return json.dumps(results)
+            # Overlap disk reads; ex.map keeps results in walk order
+            max_workers = min(32, (os.cpu_count() or 1) * 4)
+            with ThreadPoolExecutor(max_workers=max_workers) as ex:
+                md_files = (entry.path for entry in iter_files(folder_path, recursive, _MD_SUFFIXES))
+                results: List[dict] = list(ex.map(_read_one, md_files))
+
+            return dumps(results)
         except OSError as e:
             return json.dumps({"error": str(e)})
 
@@ -67,11 +92,25 @@ class AnkiConnectAddNotesTool(BaseTool):
     )
     args_schema: Type[BaseModel] = AnkiConnectAddNotesInput
 
-    def _request(self, url: str, action: str, params: dict) -> Tuple[Optional[dict], Optional[str]]:
+    _session: Optional[requests.Session] = PrivateAttr(default=None)
+
+    def _get_session(self) -> requests.Session:
+        # Reuse one keep-alive connection pool for every AnkiConnect call
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"Connection": "keep-alive", "Content-Type": "application/json"})
+            self._session = session
+        return self._session
+
+    def _request(self, url: str, action: str, params: dict) -> Tuple[Optional[Any], Optional[str]]:
         try:
-            response = requests.post(url, json={"action": action, "version": 6, "params": params}, timeout=10)
+            payload = {"action": action, "version": 6, "params": params}
+            response = self._get_session().post(url, data=dumps_bytes(payload), timeout=10)
             response.raise_for_status()
-            data = response.json()
+            data = loads(response.content)
             if data.get("error"):
                 return None, str(data["error"])
             return data.get("result"), None
@@ -81,64 +120,117 @@ class AnkiConnectAddNotesTool(BaseTool):
             return None, f"Timeout connecting to AnkiConnect at {url}. Anki might be slow to respond. Original error: {str(e)}"
         except requests.RequestException as e:
             return None, f"Request failed: {str(e)}"
-
-    def _ensure_deck(self, url: str, deck_name: str) -> Optional[str]:
-        _, err = self._request(url, "createDeck", {"deck": deck_name})
-        return err
-
-    def _ensure_model_fields(self, url: str, model_name: str) -> Tuple[bool, Optional[str]]:
-        result, err = self._request(url, "modelFieldNames", {"modelName": model_name})
+        except ValueError as e:
+            return None, f"Invalid JSON response from AnkiConnect: {str(e)}"
+
+    def _unwrap(self, reply: Any) -> Tuple[Optional[Any], Optional[str]]:
+        # Each sub-action of a "multi" request carries its own result/error pair
+        if not isinstance(reply, dict):
+            return None, "Invalid response from AnkiConnect multi action"
+        if reply.get("error"):
+            return None, str(reply["error"])
+        return reply.get("result"), None
+
+    def _multi(self, url: str, actions: List[dict]) -> Tuple[Optional[List[Any]], Optional[str]]:
+        replies, err = self._request(url, "multi", {"actions": actions})
         if err:
-            return False, err
+            return None, err
+        if not isinstance(replies, list) or len(replies) != len(actions):
+            return None, "Invalid response from AnkiConnect multi action"
+        return replies, None
+
+    def _ensure_model_fields(self, model_name: str, result: Any) -> Tuple[bool, Optional[str]]:
         if not result or not isinstance(result, list):
             return False, "Invalid response for model field names"
-        needed = {"Front", "Back"}
-        if not needed.issubset(set(result)):
-            return False, f"Model '{model_name}' missing required fields {needed}"
+        if not _REQUIRED_FIELDS.issubset(result):
+            return False, f"Model '{model_name}' missing required fields {set(_REQUIRED_FIELDS)}"
         return True, None
 
+    def _forget_model_on_error(self, model_key: Tuple[str, str], err: str) -> None:
+        # The model may have been renamed or edited in Anki; verify it again next time
+        if "model" in err.lower():
+            _CHECKED_MODELS.discard(model_key)
+
     def _run(self, deck_name: str, model_name: str = "Basic", notes: Optional[List[dict]] = None, anki_connect_url: str = "http://127.0.0.1:8765") -> str:
         try:
             if notes is None:
                 notes = []
-            # basic validation
+            # validate and build the AnkiConnect payload in one pass
             invalid_indices: List[int] = []
-            for idx, n in enumerate(notes):
-                fields = n.get("fields") or {"Front": n.get("Front"), "Back": n.get("Back")}
-                if not fields or "Front" not in fields or "Back" not in fields:
-                    invalid_indices.append(idx)
-            if invalid_indices:
-                return json.dumps({"error": f"Invalid notes at indices: {invalid_indices}. Each needs Front and Back."})
-            if not deck_name.strip():
-                return json.dumps({"error": "deck_name is required"})
-
-            # Ensure deck exists
-            err = self._ensure_deck(anki_connect_url, deck_name)
-            if err:
-                return json.dumps({"error": f"Failed to ensure deck: {err}"})
-
-            ok, err = self._ensure_model_fields(anki_connect_url, model_name)
-            if not ok:
-                return json.dumps({"error": err})
-
             prepared_notes: List[dict] = []
-            for n in notes:
+            for idx, n in enumerate(notes):
                 fields = n.get("fields") or {"Front": n.get("Front", ""), "Back": n.get("Back", "")}
-                tags = n.get("tags", [])
+                if not _REQUIRED_FIELDS.issubset(fields):
+                    invalid_indices.append(idx)
+                    continue
                 prepared_notes.append(
                     {
                         "deckName": deck_name,
                         "modelName": model_name,
                         "fields": fields,
-                        "options": {"allowDuplicate": False},
-                        "tags": tags,
+                        "options": _NOTE_OPTIONS,
+                        "tags": n.get("tags", []),
                     }
                 )
+            if invalid_indices:
+                return json.dumps({"error": f"Invalid notes at indices: {invalid_indices}. Each needs Front and Back."})
+            if not deck_name.strip():
+                return json.dumps({"error": "deck_name is required"})
 
-            result, err = self._request(anki_connect_url, "addNotes", {"notes": prepared_notes})
-            if err:
-                return json.dumps({"error": err})
-
-            return json.dumps({"result": result})
+            model_key = (anki_connect_url, model_name)
+            deck_action = {"action": "createDeck", "version": 6, "params": {"deck": deck_name}}
+            note_ids: List[Any] = []
+            if model_key in _CHECKED_MODELS:
+                # Model already verified: create the deck and add the first chunk in a single round-trip
+                add_action = {
+                    "action": "addNotes",
+                    "version": 6,
+                    "params": {"notes": prepared_notes[:_ADD_NOTES_CHUNK_SIZE]},
+                }
+                replies, err = self._multi(anki_connect_url, [deck_action, add_action])
+                if err:
+                    return json.dumps({"error": err})
+                # Report addNotes IDs even if createDeck failed, so callers do not retry blindly
+                result, add_err = self._unwrap(replies[1])
+                note_ids.extend(result or [])
+                if add_err:
+                    self._forget_model_on_error(model_key, add_err)
+                _, err = self._unwrap(replies[0])
+                err = f"Failed to ensure deck: {err}" if err else add_err
+                if err:
+                    added = sum(1 for note_id in note_ids if note_id is not None)
+                    if added:
+                        err = f"{err} ({added} notes were added anyway)"
+                    return json.dumps({"error": err, "result": note_ids})
+                next_start = _ADD_NOTES_CHUNK_SIZE
+            else:
+                # Verify deck and model before writing any note: AnkiConnect ignores unknown field
+                # names, so a model without Back would silently get notes with an empty Back
+                model_action = {"action": "modelFieldNames", "version": 6, "params": {"modelName": model_name}}
+                replies, err = self._multi(anki_connect_url, [deck_action, model_action])
+                if err:
+                    return json.dumps({"error": err})
+                _, err = self._unwrap(replies[0])
+                if err:
+                    return json.dumps({"error": f"Failed to ensure deck: {err}"})
+                field_names, err = self._unwrap(replies[1])
+                if not err:
+                    _, err = self._ensure_model_fields(model_name, field_names)
+                if err:
+                    return json.dumps({"error": err})
+                _CHECKED_MODELS.add(model_key)
+                next_start = 0
+
+            # Send the remaining notes chunk by chunk, stopping at the first failure
+            for start in range(next_start, len(prepared_notes), _ADD_NOTES_CHUNK_SIZE):
+                chunk = prepared_notes[start:start + _ADD_NOTES_CHUNK_SIZE]
+                result, err = self._request(anki_connect_url, "addNotes", {"notes": chunk})
+                if err:
+                    self._forget_model_on_error(model_key, err)
+                    added = sum(1 for note_id in note_ids if note_id is not None)
+                    return json.dumps({"error": f"Failed after adding {added} notes: {err}", "result": note_ids})
+                note_ids.extend(result or [])
+
+            return json.dumps({"result": note_ids})
         except requests.RequestException as e:
             return json.dumps({"error": str(e)})
@@ -1,7 +1,12 @@
 #!/usr/bin/env python
+import functools
+import hashlib
 import json
 import os
-from typing import List, Dict, Any
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, FrozenSet, Tuple
 
 from pydantic import BaseModel
 
@@ -9,6 +14,8 @@ from crewai.flow import Flow, listen, start
 from crewai import Crew, Process
 
 from anki_flow.crews.anki_crew.crew import AnkiCrew
+from anki_flow.crews.tools.custom_tool import AnkiConnectAddNotesTool
+from anki_flow.utils import iter_files, loads, verbose
 
 
 class AnkiState(BaseModel):
@@ -17,6 +24,16 @@ class AnkiState(BaseModel):
     approved: bool = False
 
 
+def _as_text(result: Any) -> str:
+    """Return the raw output of a crew kickoff as str."""
+    raw = getattr(result, "raw", result)
+    if isinstance(raw, str):
+        return raw
+    if isinstance(raw, (bytes, bytearray)):
+        return raw.decode("utf-8", errors="ignore")
+    return str(raw)
+
+
 def _abs_notes_folder() -> str:
     base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
     return os.path.join(base_dir, "notes_folder")
@@ -35,9 +52,79 @@ def _save_flashcards_to_file(flashcards: List[Dict[str, Any]], path: str = None)
         json.dump({"flashcards": flashcards}, f, ensure_ascii=False, indent=2)
 
 
-def _run_generate_flashcards(deck_name: str) -> List[Dict[str, Any]]:
+def _scan_notes_folder(folder_path: str) -> List[Tuple[str, os.stat_result]]:
+    """Return (path, stat) for every file under the notes folder, or an empty list if it is missing."""
+    return [(entry.path, entry.stat()) for entry in iter_files(folder_path)]
+
+
+def _note_extensions(files: List[Tuple[str, os.stat_result]]) -> FrozenSet[str]:
+    return frozenset(os.path.splitext(path)[1].lower() for path, _ in files)
+
+
+def _flashcards_cache_path(note_files: List[Tuple[str, os.stat_result]]) -> str | None:
+    """
+    Path of the approved-flashcards cache entry for the current notes, prompts and settings,
+    or None when caching is disabled with ANKI_NO_CACHE=1.
+    """
+    if os.environ.get("ANKI_NO_CACHE") == "1":
+        return None
+    # Any change to the notes (path, mtime, size of every file), the agent/task prompts,
+    # the LLM, the note type or the tags gives a different entry.
+    digest = hashlib.blake2b(digest_size=16)
+    for name in ("MODEL", "ANKI_MODEL", "ANKI_TAGS"):
+        digest.update(f"{name}={os.environ.get(name, '')}\n".encode("utf-8"))
+    config_dir = os.path.join(os.path.dirname(__file__), "crews", "anki_crew", "config")
+    for config_name in ("agents.yaml", "tasks.yaml"):
+        with open(os.path.join(config_dir, config_name), "rb") as f:
+            digest.update(f.read())
+    for path, st in sorted(note_files):
+        digest.update(f"{path}:{st.st_mtime_ns}:{st.st_size}\n".encode("utf-8"))
+
+    cache_root = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_root, "anki_flow", f"{digest.hexdigest()}.json")
+
+
+@functools.lru_cache(maxsize=4)
+def _shared_crew(note_extensions: FrozenSet[str] | None = None) -> AnkiCrew:
+    # AnkiCrew memoizes its agents and tasks, so reusing an instance skips rebuilding the tools.
+    # Keyed by the note file types so adding e.g. a PDF gets a generator with the PDF tool.
+    return AnkiCrew(note_extensions=note_extensions)
+
+
+def _load_cached_flashcards(path: str) -> List[Dict[str, Any]] | None:
+    try:
+        with open(path, "rb") as f:
+            data = loads(f.read())
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, list) else None
+
+
+def _store_cached_flashcards(path: str, flashcards: List[Dict[str, Any]]) -> None:
+    # Write to a temp file and rename so parallel runs never see a partial entry
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(flashcards, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass  # the cache is best effort
+
+
+def _run_generate_flashcards(
+    deck_name: str,
+    crew_builder: AnkiCrew | None = None,
+    note_files: List[Tuple[str, os.stat_result]] | None = None,
+    folder_path: str | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Generate flashcards from folder_path (default: the notes folder).
+    Pass crew_builder to avoid sharing the process-wide AnkiCrew (e.g. from worker threads),
+    or note_files (from _scan_notes_folder) to reuse a scan the caller already made.
+    """
     inputs = {
-        "folder_path": _abs_notes_folder(),
+        "folder_path": folder_path or _abs_notes_folder(),
         "deck_name": deck_name,
         # Optional inputs used by prompts; safe defaults
         "model_name": os.environ.get("ANKI_MODEL", "Basic"),
@@ -45,36 +132,39 @@ def _run_generate_flashcards(deck_name: str) -> List[Dict[str, Any]]:
     }
 
     # Build a crew that contains only the generation task
-    crew_builder = AnkiCrew()
+    if crew_builder is None:
+        if note_files is None:
+            note_files = _scan_notes_folder(inputs["folder_path"])
+        crew_builder = _shared_crew(_note_extensions(note_files))
     generator_agent = crew_builder.flashcard_generator()
     generate_task = crew_builder.generate_flashcards()
     generation_crew = Crew(
         agents=[generator_agent],
         tasks=[generate_task],
         process=Process.sequential,
-        verbose=True,
+        verbose=verbose(),
     )
 
     result = generation_crew.kickoff(inputs=inputs)
 
-    raw = getattr(result, "raw", result)
-    if isinstance(raw, (bytes, bytearray)):
-        raw = raw.decode("utf-8", errors="ignore")
+    raw_s = _as_text(result)
 
     # Parse result into a JSON array of flashcards
     try:
-        data = json.loads(raw)
+        data = loads(raw_s)
     except Exception as exc:
         # Attempt to extract JSON array substring as fallback
-        start_idx = str(raw).find("[")
-        end_idx = str(raw).rfind("]")
-        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-            data = json.loads(str(raw)[start_idx : end_idx + 1])
+        start_idx = raw_s.find("[")
+        end_idx = raw_s.rfind("]", start_idx + 1) if start_idx != -1 else -1
+        if end_idx != -1:
+            data = loads(raw_s[start_idx : end_idx + 1])
         else:
             raise ValueError("Failed to parse generated flashcards JSON.") from exc
 
     if not isinstance(data, list):
         raise ValueError("Generated output is not a JSON array of flashcards.")
+    if not all(isinstance(card, dict) for card in data):
+        raise ValueError("Generated flashcards must all be JSON objects.")
 
     return data
 
@@ -87,20 +177,18 @@ def _upload_to_anki(deck_name: str, notes: List[Dict[str, Any]]) -> Dict[str, An
         "flashcards": notes,
     }
 
-    crew_builder = AnkiCrew()
+    crew_builder = _shared_crew(frozenset())  # the uploader needs no search tools
     uploader_agent = crew_builder.anki_uploader()
     upload_task = crew_builder.upload_to_anki()
     upload_crew = Crew(
         agents=[uploader_agent],
         tasks=[upload_task],
         process=Process.sequential,
-        verbose=True,
+        verbose=verbose(),
     )
 
     result = upload_crew.kickoff(inputs=inputs)
-    raw = getattr(result, "raw", result)
-    if isinstance(raw, (bytes, bytearray)):
-        raw = raw.decode("utf-8", errors="ignore")
+    raw = _as_text(result)
     try:
         return json.loads(raw)
     except Exception:
@@ -130,8 +218,8 @@ def upload_only():
         # Read from anki_flow/flashcards directory
         base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
         flashcards_path = os.path.join(base_dir, "flashcards", "flashcards.json")
-        with open(flashcards_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(flashcards_path, "rb") as f:
+            data = loads(f.read())
         notes = data.get("flashcards")
         if not isinstance(notes, list):
             raise ValueError("Invalid flashcards.json format: 'flashcards' must be a list.")
@@ -149,27 +237,139 @@ def upload_only():
         print("Upload completed.")
 
 
+def _max_workers() -> int:
+    """Number of decks generated at the same time, from ANKI_MAX_WORKERS (default 4, at least 1)."""
+    value = os.environ.get("ANKI_MAX_WORKERS", "4")
+    try:
+        return max(1, int(value))
+    except ValueError:
+        raise ValueError(f"ANKI_MAX_WORKERS must be a whole number, got {value!r}.") from None
+
+
+def _deck_notes_folder(deck_name: str) -> str | None:
+    """Return notes_folder/<deck_name> if it is an existing folder inside the notes folder, else None."""
+    notes_root = _abs_notes_folder()
+    folder_path = os.path.join(notes_root, deck_name)
+    if os.path.dirname(os.path.normpath(folder_path)) != os.path.normpath(notes_root):
+        return None  # e.g. "../x" or a nested "a/b" would point elsewhere
+    return folder_path if os.path.isdir(folder_path) else None
+
+
+def _generate_and_upload_many(deck_names: List[str], max_workers: int = 4) -> Dict[str, Dict[str, Any]]:
+    """
+    Generate flashcards for several decks in parallel, each from its own notes_folder/<deck name>,
+    then upload every deck that generated successfully.
+    Returns the AnkiConnect result or an error description per deck.
+    """
+    deck_names = list(dict.fromkeys(deck_names))
+    results: Dict[str, Dict[str, Any]] = {}
+    folders: Dict[str, str] = {}
+    for deck_name in deck_names:
+        folder_path = _deck_notes_folder(deck_name)
+        if folder_path is None:
+            results[deck_name] = {"error": f"No notes folder for this deck: expected notes_folder/{deck_name}"}
+            print(f"Skipping '{deck_name}': {results[deck_name]['error']}")
+        else:
+            folders[deck_name] = folder_path
+    if not folders:
+        return results
+
+    print(f"Generating flashcards for {len(folders)} decks...")
+    with ThreadPoolExecutor(max_workers=min(len(folders), max_workers)) as executor:
+        futures = {}
+        for deck_name, folder_path in folders.items():
+            note_files = _scan_notes_folder(folder_path)
+            # Each deck gets its own AnkiCrew: agents and tasks hold per-run state
+            futures[deck_name] = executor.submit(
+                _run_generate_flashcards,
+                deck_name,
+                crew_builder=AnkiCrew(note_extensions=_note_extensions(note_files)),
+                note_files=note_files,
+                folder_path=folder_path,
+            )
+
+    # Upload directly through one tool instance so all decks share its AnkiConnect session
+    uploader = AnkiConnectAddNotesTool()
+    model_name = os.environ.get("ANKI_MODEL", "Basic")
+    tags = os.environ.get("ANKI_TAGS", "").split(",") if os.environ.get("ANKI_TAGS") else []
+    for deck_name, future in futures.items():
+        # One failed deck must not discard the decks that succeeded
+        try:
+            flashcards = future.result()
+        except Exception as exc:
+            results[deck_name] = {"error": f"Generation failed: {exc}"}
+            print(f"Generating flashcards for '{deck_name}' failed: {exc}")
+            continue
+        try:
+            notes = [{**card, "tags": card.get("tags") or tags} for card in flashcards]
+            result = json.loads(uploader.run(deck_name=deck_name, model_name=model_name, notes=notes))
+        except Exception as exc:
+            result = {"error": str(exc)}
+        if result.get("error"):
+            print(f"Upload to '{deck_name}' failed: {result['error']}")
+        else:
+            print(f"Upload to '{deck_name}' completed.")
+        results[deck_name] = result
+    return results
+
+
+def kickoff_many() -> int:
+    """
+    Entry point for the kickoff-many script: deck names are taken from the command line.
+    Returns the process exit code (non-zero if any deck failed).
+    """
+    deck_names = [name for name in sys.argv[1:] if name.strip()]
+    if not deck_names:
+        print("Usage: kickoff-many <deck name> [<deck name> ...]")
+        return 2
+    try:
+        max_workers = _max_workers()
+    except ValueError as exc:
+        print(exc)
+        return 2
+    results = _generate_and_upload_many(deck_names, max_workers=max_workers)
+    return 1 if any(result.get("error") for result in results.values()) else 0
+
+
 class AnkiFlow(Flow[AnkiState]):
-    def __init__(self):
+    def __init__(self, deck_name: str | None = None):
+        """
+        deck_name skips the prompt; it can also be passed as kickoff(inputs={"deck_name": ...}).
+        """
         super().__init__()
-        while True:
-            name_of_deck = input("Enter name of deck: ")
-            if name_of_deck:
-                break
-            else:
-                print("Please type a name for the deck.")
-        self.name_of_deck = name_of_deck
+        self.name_of_deck = deck_name
 
     @start()
     def deck_name_input(self):
-        self.state.deck_name = self.name_of_deck
+        name_of_deck = self.state.deck_name or self.name_of_deck
+        # Without an override, read stdin as before (a terminal or a pipe such as `echo Deck | kickoff`)
+        while not name_of_deck:
+            if sys.stdin is None or sys.stdin.closed:
+                raise ValueError("No deck name given and stdin is unavailable. Pass deck_name instead.")
+            try:
+                name_of_deck = input("Enter name of deck: ")
+            except EOFError:
+                raise ValueError("No deck name given: stdin ended before a name was entered.") from None
+            if not name_of_deck:
+                print("Please type a name for the deck.")
+        self.state.deck_name = name_of_deck
         print(f"✓ Deck name set to: {self.state.deck_name}")
      
     @listen(deck_name_input)
     def generate_and_review(self):
+        # Unchanged notes and prompts start from the set approved last time;
+        # asking to regenerate always calls the LLM
+        use_cache = True
         while True:
-            print("Generating flashcards from notes...")
-            flashcards = _run_generate_flashcards(self.state.deck_name)
+            # Key the cache on the notes as they are before generating; one scan serves both
+            note_files = _scan_notes_folder(_abs_notes_folder())
+            cache_path = _flashcards_cache_path(note_files)
+            flashcards = _load_cached_flashcards(cache_path) if use_cache and cache_path else None
+            if flashcards is not None:
+                print("Reusing flashcards approved earlier for these notes (set ANKI_NO_CACHE=1 to skip).")
+            else:
+                print("Generating flashcards from notes...")
+                flashcards = _run_generate_flashcards(self.state.deck_name, note_files=note_files)
             self.state.flashcards = flashcards
             _save_flashcards_to_file(flashcards)
             print("Flashcards saved to 'anki_flow/flashcards/flashcards.json'.")
@@ -179,9 +379,12 @@ class AnkiFlow(Flow[AnkiState]):
                 if answer == "y":
                     # Mark as approved; a dedicated step will handle upload
                     self.state.approved = True
+                    if cache_path:
+                        _store_cached_flashcards(cache_path, flashcards)
                     return  # Exit both loops
                 elif answer == "n":
                     print("Regenerating flashcards...")
+                    use_cache = False
                     break  # Break inner loop to regenerate
                 else:
                     print("Wrong answer. Type either 'y' to accept or 'n' to generate a new set of flashcards.")
@@ -0,0 +1,55 @@
+import json
+import os
+from typing import Any, Iterator, Tuple
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to stdlib json
+    orjson = None
+
+
+def dumps(obj: Any) -> str:
+    """Serialize obj to a JSON str, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj)
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Serialize obj to UTF-8 JSON bytes, e.g. for an HTTP request body."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+
+def loads(data: str | bytes) -> Any:
+    """Parse JSON from str or bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def verbose() -> bool:
+    """True when ANKI_VERBOSE=1, enabling CrewAI's verbose agent and crew logging."""
+    return os.environ.get("ANKI_VERBOSE") == "1"
+
+
+def iter_files(root: str, recursive: bool = True, suffixes: Tuple[str, ...] | None = None) -> Iterator[os.DirEntry]:
+    """
+    Yield a DirEntry for every regular file under root, optionally only names ending in suffixes.
+    Symlinked files are included (as with Path.rglob); symlinked directories are not entered,
+    which avoids cycles. Directories that cannot be listed are skipped.
+    """
+    stack = [root]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        stack.append(entry.path)
+                elif entry.is_file() and (suffixes is None or entry.name.endswith(suffixes)):
+                    yield entry